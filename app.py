@@ -1,12 +1,14 @@
 # nl2sql_demo.py
 import streamlit as st
 import pandas as pd
+import numpy as np
+import altair as alt
 import sqlite3  # Built-in, no pip install needed
 import json
-import random
 from datetime import datetime, timedelta
 import re
 import os
+import functools
 
 # Set page config FIRST
 st.set_page_config(
@@ -19,67 +21,259 @@ st.set_page_config(
 st.title("📊 Sales Data NL2SQL Demo")
 st.markdown("Ask natural language questions about sales data and see the generated SQL and results!")
 
-# Initialize session state
-if 'df' not in st.session_state:
-    st.session_state.df = None
-if 'conn' not in st.session_state:
-    st.session_state.conn = None
+# Initialize session state; data and connection live in the Streamlit cache keyed on n_rows
+if 'n_rows' not in st.session_state:
+    st.session_state.n_rows = None
+
+# Caches are shared by every session for the life of the process, so keep only
+# a few datasets (frame + in-memory DB) and recent query results around
+DATASET_CACHE_ENTRIES = 4
+QUERY_CACHE_ENTRIES = 32
 
 # ==============================
 # 1. Generate Sample Sales Data (Streamlit Cloud compatible)
 # ==============================
 
+@st.cache_data(show_spinner=False, max_entries=DATASET_CACHE_ENTRIES)
 def generate_sales_data(n_rows: int = 1000):
     """Generate synthetic sales data - Streamlit Cloud safe"""
     
     # Use deterministic random for consistent results
-    random.seed(42)  # Fixed seed for reproducibility
+    rng = np.random.default_rng(42)  # Fixed seed for reproducibility
     
     regions = ['North America', 'Europe', 'Asia Pacific', 'Latin America', 'Middle East']
     products = ['Laptop Pro', 'Phone X', 'Tablet Air', 'Monitor Ultra', 'Keyboard Elite']
     categories = ['Electronics', 'Accessories', 'Computers', 'Mobile']
     payment_methods = ['Credit Card', 'PayPal', 'Bank Transfer']
+    customer_types = ['New', 'Returning']
     
-    data = []
-    for i in range(n_rows):
-        # Use modulo to avoid large date ranges
-        order_date = datetime(2023, 1, 1) + timedelta(days=i % 365)
-        quantity = random.randint(1, 5)
-        unit_price = round(random.uniform(50, 1000), 2)
-        
-        row = {
-            'order_id': f'ORD{i:05d}',
-            'customer_id': f'CUST{random.randint(1000, 9999)}',
-            'order_date': order_date.strftime('%Y-%m-%d'),
-            'product': random.choice(products),
-            'category': random.choice(categories),
-            'region': random.choice(regions),
-            'quantity': quantity,
-            'unit_price': unit_price,
-            'total_sales': round(quantity * unit_price, 2),
-            'profit': round(quantity * unit_price * random.uniform(0.2, 0.5), 2),
-            'payment_method': random.choice(payment_methods),
-            'customer_type': random.choice(['New', 'Returning']),
-            'discount': round(random.uniform(0, 0.2), 2)
-        }
-        data.append(row)
-    
-    return pd.DataFrame(data)
+    # Build whole columns at once instead of one dict per row; low-cardinality
+    # text columns are kept as Categoricals (small integer codes + labels)
+    ids = np.arange(n_rows)
+    quantity = rng.integers(1, 6, n_rows, dtype=np.int8)
+    unit_price = np.round(rng.uniform(50, 1000, n_rows), 2)
+    gross = quantity * unit_price
+    # Only 365 distinct dates exist, so format each once and index into them
+    date_lut = np.array([(datetime(2023, 1, 1) + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(365)])
+    
+    return pd.DataFrame({
+        'order_id': np.char.add('ORD', np.char.zfill(ids.astype(str), 5)),
+        'customer_id': np.char.add('CUST', rng.integers(1000, 10000, n_rows).astype('U4')),
+        'order_date': np.take(date_lut, ids % 365),  # Use modulo to avoid large date ranges
+        'product': pd.Categorical.from_codes(rng.integers(0, len(products), n_rows), products),
+        'category': pd.Categorical.from_codes(rng.integers(0, len(categories), n_rows), categories),
+        'region': pd.Categorical.from_codes(rng.integers(0, len(regions), n_rows), regions),
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'total_sales': np.round(gross, 2),
+        'profit': np.round(gross * rng.uniform(0.2, 0.5, n_rows), 2),
+        'payment_method': pd.Categorical.from_codes(rng.integers(0, len(payment_methods), n_rows), payment_methods),
+        'customer_type': pd.Categorical.from_codes(rng.integers(0, len(customer_types), n_rows), customer_types),
+        'discount': np.round(rng.uniform(0, 0.2, n_rows), 2)
+    })
+
+@st.cache_data(show_spinner=False, max_entries=DATASET_CACHE_ENTRIES)
+def summarize_sales(n_rows: int = 1000):
+    """Headline metrics for the generated data, computed once per n_rows"""
+    df = generate_sales_data(n_rows)
+    return {
+        'total_orders': len(df),
+        'total_sales': float(df['total_sales'].sum()),
+        'unique_customers': int(df['customer_id'].nunique())
+    }
 
 # ==============================
 # 2. Database Setup
 # ==============================
 
-def setup_database(df: pd.DataFrame):
-    """Convert DataFrame to SQLite database"""
-    conn = sqlite3.connect(':memory:', check_same_thread=False)
-    df.to_sql('sales', conn, if_exists='replace', index=False)
+# Aggregates behind the canned questions, materialized once at load time
+SUMMARY_TABLES = {
+    'sales_by_region': "SELECT region, SUM(total_sales) as total_sales FROM sales GROUP BY region",
+    'sales_by_product': "SELECT product, SUM(quantity) as total_quantity FROM sales GROUP BY product",
+    'sales_by_category': "SELECT category, SUM(profit) as total_profit FROM sales GROUP BY category",
+    # order_date is ISO text, so the month is a plain prefix; no per-row date parsing
+    'sales_by_month': "SELECT substr(order_date, 1, 7) as month, SUM(total_sales) as monthly_sales FROM sales GROUP BY month",
+}
+
+# SQLite column types by numpy dtype kind; everything else is stored as TEXT
+SQLITE_TYPES = {'i': 'INTEGER', 'u': 'INTEGER', 'b': 'INTEGER', 'f': 'REAL'}
+
+@st.cache_resource(show_spinner=False, max_entries=DATASET_CACHE_ENTRIES)
+def setup_database(n_rows: int = 1000):
+    """Convert generated sales data to SQLite database (cached on n_rows, not the DataFrame)"""
+    df = generate_sales_data(n_rows)
+    # Autocommit mode: the load below manages its own single transaction
+    conn = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False)
+    # Durability is irrelevant for an in-memory database
+    conn.executescript("""
+        PRAGMA synchronous=OFF;
+        PRAGMA journal_mode=MEMORY;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+    """)
+    
+    columns = ', '.join(f"{col} {SQLITE_TYPES.get(dtype.kind, 'TEXT')}" for col, dtype in df.dtypes.items())
+    placeholders = ', '.join('?' * len(df.columns))
+    conn.execute("BEGIN")
+    try:
+        conn.execute(f"CREATE TABLE sales ({columns})")
+        conn.executemany(f"INSERT INTO sales VALUES ({placeholders})", df.itertuples(index=False, name=None))
+        conn.execute("CREATE INDEX ix_region ON sales(region)")
+        conn.execute("CREATE INDEX ix_date ON sales(order_date)")
+        for table, select in SUMMARY_TABLES.items():
+            conn.execute(f"CREATE TABLE {table} AS {select}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    
+    # Prepare the canned queries once; sqlite3 reuses compiled statements for identical SQL text
+    for sql in set(SAMPLE_SQL.values()):
+        conn.execute(sql).fetchall()
     return conn
 
+# Cap on rows pulled back for display; aggregates are computed in SQL
+MAX_RESULT_ROWS = 1000
+# Rows actually sent to the browser table; larger fetched results are offered as CSV
+MAX_DISPLAY_ROWS = 500
+
+def run_query(conn: sqlite3.Connection, sql: str):
+    """Execute SQL and fetch at most MAX_RESULT_ROWS rows; returns (DataFrame, truncated)"""
+    cursor = conn.execute(sql)
+    columns = [col[0] for col in cursor.description]
+    # One extra row tells us whether anything was left behind
+    rows = cursor.fetchmany(MAX_RESULT_ROWS + 1)
+    truncated = len(rows) > MAX_RESULT_ROWS
+    return pd.DataFrame(rows[:MAX_RESULT_ROWS], columns=columns), truncated
+
+@st.cache_data(show_spinner=False, max_entries=QUERY_CACHE_ENTRIES)
+def query_sales(sql: str, n_rows: int):
+    """Run SQL against the cached database for n_rows, memoizing (DataFrame, truncated)"""
+    return run_query(setup_database(n_rows), sql)
+
+# ==============================
+# 3. Rule-based SQL Generation
+# ==============================
+
+QUERY_SQL = {
+    'region': """
+            SELECT region, total_sales 
+            FROM sales_by_region 
+            ORDER BY total_sales DESC
+            """,
+    'top': """
+            SELECT product, total_quantity 
+            FROM sales_by_product 
+            ORDER BY total_quantity DESC 
+            LIMIT {limit}
+            """,
+    'trend': """
+            SELECT month, monthly_sales 
+            FROM sales_by_month 
+            ORDER BY month
+            """,
+    'category': """
+            SELECT category, total_profit 
+            FROM sales_by_category 
+            ORDER BY total_profit DESC
+            """,
+}
+DEFAULT_SQL = "SELECT * FROM sales LIMIT 10"
+
+# One pass over the question instead of a chain of substring checks;
+# alternatives are tried in priority order and keywords may appear in any order
+QUERY_ROUTER = re.compile(r"""
+    ^(?:
+        (?P<region>(?=.*total\ sales)(?=.*region))
+      | (?P<top>(?=.*top)(?=.*product))
+      | (?P<trend>(?=.*(?:monthly|trend)))
+      | (?P<category>(?=.*profit)(?=.*category))
+    )
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+TOP_N_PATTERN = re.compile(r'top\s+(\d+)', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=256)
+def route_question(question: str) -> str:
+    """Map a natural language question to SQL using simple keyword rules"""
+    match = QUERY_ROUTER.match(question)
+    if match is None:
+        return DEFAULT_SQL
+    
+    if match.lastgroup == 'top':
+        top_n = TOP_N_PATTERN.search(question)
+        return QUERY_SQL['top'].format(limit=top_n.group(1) if top_n else 5)
+    return QUERY_SQL[match.lastgroup]
+
+# Sidebar sample questions, resolved to SQL once at import
+SAMPLE_SQL = {q: route_question(q) for q in [
+    "Show total sales by region",
+    "Top 5 products by quantity",
+    "Monthly sales trend",
+    "Profit by category",
+    "Customer types analysis",
+    "Payment methods summary"
+]}
+
 # ==============================
-# 3. Main App (Simplified for Cloud)
+# 4. Main App (Simplified for Cloud)
 # ==============================
 
+@st.fragment
+def query_panel(n_rows: int):
+    """Question box and results; reruns on its own without redrawing the rest of the page"""
+    st.header("🔍 Ask Questions About the Data")
+    
+    if 'current_question' not in st.session_state:
+        st.session_state.current_question = ""
+    
+    # A form only reruns the script on submit, not on every keystroke
+    with st.form("question_form"):
+        question = st.text_input(
+            "Type your question:",
+            value=st.session_state.current_question,
+            placeholder="e.g., 'Show total sales by region'"
+        )
+        st.form_submit_button("🔍 Ask")
+    
+    if question:
+        sql = SAMPLE_SQL.get(question) or route_question(question)
+        
+        # Display SQL
+        st.subheader("📝 Generated SQL")
+        st.code(sql, language='sql')
+        
+        # Execute and show results
+        try:
+            result_df, truncated = query_sales(sql, n_rows)
+            st.subheader(f"📊 Results ({len(result_df)} rows)")
+            if truncated:
+                st.caption(f"The query returned more rows; only the first {MAX_RESULT_ROWS:,} were fetched.")
+            
+            if not result_df.empty:
+                st.dataframe(result_df.head(MAX_DISPLAY_ROWS))
+                if len(result_df) > MAX_DISPLAY_ROWS:
+                    st.caption(f"Table shows the first {MAX_DISPLAY_ROWS:,} of {len(result_df):,} fetched rows.")
+                    # The CSV holds only what run_query fetched, never more than MAX_RESULT_ROWS
+                    st.download_button(
+                        f"⬇️ Download fetched rows as CSV ({len(result_df):,})",
+                        result_df.to_csv(index=False).encode(),
+                        "results.csv",
+                        mime="text/csv"
+                    )
+                
+                # Simple chart for certain queries
+                columns = frozenset(result_df.columns)
+                if {'region', 'total_sales'} <= columns:
+                    chart = alt.Chart(result_df).mark_bar().encode(x='region:N', y='total_sales:Q')
+                    st.altair_chart(chart, use_container_width=True)
+                elif {'month', 'monthly_sales'} <= columns:
+                    chart = alt.Chart(result_df).mark_line().encode(x='month:O', y='monthly_sales:Q')
+                    st.altair_chart(chart, use_container_width=True)
+                    
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+            st.info("Try a simpler question like 'Show total sales by region'")
+
 def main():
     # Sidebar
     with st.sidebar:
@@ -87,119 +281,45 @@ def main():
         n_rows = st.slider("Sample Data Size", 100, 2000, 500)
         
         if st.button("🔄 Generate Data", type="primary"):
-            with st.spinner("Generating data..."):
-                st.session_state.df = generate_sales_data(n_rows)
-                st.session_state.conn = setup_database(st.session_state.df)
+            if n_rows != st.session_state.n_rows:
+                with st.spinner("Generating data..."):
+                    setup_database(n_rows)
+                st.session_state.n_rows = n_rows
             st.success(f"Generated {n_rows} rows!")
         
         st.markdown("---")
         st.subheader("💡 Try These Questions:")
         
-        sample_questions = [
-            "Show total sales by region",
-            "Top 5 products by quantity",
-            "Monthly sales trend",
-            "Profit by category",
-            "Customer types analysis",
-            "Payment methods summary"
-        ]
-        
-        for q in sample_questions:
+        for q in SAMPLE_SQL:
             if st.button(f"▸ {q}"):
                 st.session_state.current_question = q
                 st.rerun()
     
     # Initialize if first run
-    if st.session_state.df is None:
+    if st.session_state.n_rows is None:
         with st.spinner("Loading demo data..."):
-            st.session_state.df = generate_sales_data(500)
-            st.session_state.conn = setup_database(st.session_state.df)
+            setup_database(500)
+        st.session_state.n_rows = 500
+    
+    # Cached per n_rows, so reruns don't rebuild anything
+    df = generate_sales_data(st.session_state.n_rows)
     
     # Display data stats
+    kpis = summarize_sales(st.session_state.n_rows)
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Orders", f"{len(st.session_state.df):,}")
+        st.metric("Total Orders", f"{kpis['total_orders']:,}")
     with col2:
-        total_sales = st.session_state.df['total_sales'].sum()
-        st.metric("Total Sales", f"${total_sales:,.0f}")
+        st.metric("Total Sales", f"${kpis['total_sales']:,.0f}")
     with col3:
-        unique_customers = st.session_state.df['customer_id'].nunique()
-        st.metric("Unique Customers", unique_customers)
+        st.metric("Unique Customers", kpis['unique_customers'])
     
     # Data preview
     with st.expander("📋 View Sample Data"):
-        st.dataframe(st.session_state.df.head(10))
+        st.dataframe(df.head(10))
     
     # Query interface
-    st.header("🔍 Ask Questions About the Data")
-    
-    if 'current_question' not in st.session_state:
-        st.session_state.current_question = ""
-    
-    question = st.text_input(
-        "Type your question:",
-        value=st.session_state.current_question,
-        placeholder="e.g., 'Show total sales by region'"
-    )
-    
-    if question:
-        # Simple rule-based SQL generation
-        question_lower = question.lower()
-        
-        if 'total sales' in question_lower and 'region' in question_lower:
-            sql = """
-            SELECT region, SUM(total_sales) as total_sales 
-            FROM sales 
-            GROUP BY region 
-            ORDER BY total_sales DESC
-            """
-        elif 'top' in question_lower and 'product' in question_lower:
-            sql = """
-            SELECT product, SUM(quantity) as total_quantity 
-            FROM sales 
-            GROUP BY product 
-            ORDER BY total_quantity DESC 
-            LIMIT 5
-            """
-        elif 'monthly' in question_lower or 'trend' in question_lower:
-            sql = """
-            SELECT strftime('%Y-%m', order_date) as month, 
-                   SUM(total_sales) as monthly_sales 
-            FROM sales 
-            GROUP BY month 
-            ORDER BY month
-            """
-        elif 'profit' in question_lower and 'category' in question_lower:
-            sql = """
-            SELECT category, SUM(profit) as total_profit 
-            FROM sales 
-            GROUP BY category 
-            ORDER BY total_profit DESC
-            """
-        else:
-            sql = "SELECT * FROM sales LIMIT 10"
-        
-        # Display SQL
-        st.subheader("📝 Generated SQL")
-        st.code(sql, language='sql')
-        
-        # Execute and show results
-        try:
-            result_df = pd.read_sql_query(sql, st.session_state.conn)
-            st.subheader(f"📊 Results ({len(result_df)} rows)")
-            
-            if not result_df.empty:
-                st.dataframe(result_df)
-                
-                # Simple chart for certain queries
-                if 'region' in result_df.columns and 'total_sales' in result_df.columns:
-                    st.bar_chart(result_df.set_index('region')['total_sales'])
-                elif 'month' in result_df.columns and 'monthly_sales' in result_df.columns:
-                    st.line_chart(result_df.set_index('month')['monthly_sales'])
-                    
-        except Exception as e:
-            st.error(f"Error: {str(e)}")
-            st.info("Try a simpler question like 'Show total sales by region'")
+    query_panel(st.session_state.n_rows)
     
     # Footer
     st.markdown("---")
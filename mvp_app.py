@@ -2,7 +2,10 @@
 import streamlit as st
 import pandas as pd
 import sqlite3
-import random
+import re
+import functools
+import numpy as np
+import altair as alt
 from datetime import datetime, timedelta
 
 st.set_page_config(
@@ -22,23 +25,70 @@ if 'conn' not in st.session_state:
 
 def create_sample_data(rows=500):
     """Create sample sales data"""
-    data = []
-    for i in range(rows):
-        data.append({
-            'order_id': f'ORD{i:05d}',
-            'customer_id': f'CUST{random.randint(1000, 9999)}',
-            'order_date': (datetime(2023, 1, 1) + timedelta(days=i % 365)).strftime('%Y-%m-%d'),
-            'product': random.choice(['Laptop', 'Phone', 'Tablet', 'Monitor']),
-            'region': random.choice(['North', 'South', 'East', 'West']),
-            'quantity': random.randint(1, 5),
-            'price': round(random.uniform(100, 2000), 2),
-            'total_sales': 0  # Will calculate
-        })
+    rng = np.random.default_rng()
+    ids = np.arange(rows)
+    dates = np.array([(datetime(2023, 1, 1) + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(365)])
+    products = np.array(['Laptop', 'Phone', 'Tablet', 'Monitor'])
+    regions = np.array(['North', 'South', 'East', 'West'])
     
-    df = pd.DataFrame(data)
-    df['total_sales'] = df['quantity'] * df['price']
+    # One vectorized draw per column instead of one dict per row
+    df = pd.DataFrame({
+        'order_id': np.char.add('ORD', np.char.zfill(ids.astype(str), 5)),
+        'customer_id': np.char.add('CUST', rng.integers(1000, 10000, rows).astype('U4')),
+        'order_date': np.take(dates, ids % 365),
+        'product': np.take(products, rng.integers(0, len(products), rows)),
+        'region': np.take(regions, rng.integers(0, len(regions), rows)),
+        'quantity': rng.integers(1, 6, rows, dtype=np.int8),
+        'price': np.round(rng.uniform(100, 2000, rows), 2),
+    })
+    df['total_sales'] = np.round(df['quantity'] * df['price'], 2)
     return df
 
+QUERY_SQL = {
+    'region': """
+            SELECT region, SUM(total_sales) as total_sales 
+            FROM sales 
+            GROUP BY region 
+            ORDER BY total_sales DESC
+            """,
+    'top': """
+            SELECT product, SUM(quantity) as total_quantity 
+            FROM sales 
+            GROUP BY product 
+            ORDER BY total_quantity DESC 
+            LIMIT 5
+            """,
+    'trend': """
+            SELECT strftime('%Y-%m', order_date) as month, 
+                   SUM(total_sales) as monthly_sales 
+            FROM sales 
+            GROUP BY month 
+            ORDER BY month
+            """,
+    'price': """
+            SELECT product, AVG(price) as avg_price 
+            FROM sales 
+            GROUP BY product 
+            ORDER BY avg_price DESC
+            """,
+}
+
+# Single compiled pass over the question; alternatives are tried in priority order
+QUERY_ROUTER = re.compile(r"""
+    ^(?:
+        (?P<region>(?=.*total\ sales)(?=.*region))
+      | (?P<top>(?=.*top)(?=.*product))
+      | (?P<trend>(?=.*(?:monthly|trend)))
+      | (?P<price>(?=.*average)(?=.*price))
+    )
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+
+@functools.lru_cache(maxsize=256)
+def route_question(question):
+    """Simple rule-based SQL generation"""
+    match = QUERY_ROUTER.match(question)
+    return QUERY_SQL[match.lastgroup] if match else "SELECT * FROM sales LIMIT 10"
+
 # Sidebar
 with st.sidebar:
     st.header("⚙️ Settings")
@@ -83,41 +133,7 @@ if st.session_state.df is not None:
             question = custom_q
     
     if question and question != "Custom query...":
-        # Simple rule-based SQL generation
-        question_lower = question.lower()
-        
-        if 'total sales' in question_lower and 'region' in question_lower:
-            sql = """
-            SELECT region, SUM(total_sales) as total_sales 
-            FROM sales 
-            GROUP BY region 
-            ORDER BY total_sales DESC
-            """
-        elif 'top' in question_lower and 'product' in question_lower:
-            sql = """
-            SELECT product, SUM(quantity) as total_quantity 
-            FROM sales 
-            GROUP BY product 
-            ORDER BY total_quantity DESC 
-            LIMIT 5
-            """
-        elif 'monthly' in question_lower or 'trend' in question_lower:
-            sql = """
-            SELECT strftime('%Y-%m', order_date) as month, 
-                   SUM(total_sales) as monthly_sales 
-            FROM sales 
-            GROUP BY month 
-            ORDER BY month
-            """
-        elif 'average' in question_lower and 'price' in question_lower:
-            sql = """
-            SELECT product, AVG(price) as avg_price 
-            FROM sales 
-            GROUP BY product 
-            ORDER BY avg_price DESC
-            """
-        else:
-            sql = "SELECT * FROM sales LIMIT 10"
+        sql = route_question(question)
         
         # Display and execute
         st.subheader("📝 Generated SQL")
@@ -131,11 +147,14 @@ if st.session_state.df is not None:
             # Simple visualization
             if len(result) > 1:
                 if 'region' in result.columns and 'total_sales' in result.columns:
-                    st.bar_chart(result.set_index('region')['total_sales'])
+                    chart = alt.Chart(result).mark_bar().encode(x='region:N', y='total_sales:Q')
+                    st.altair_chart(chart, use_container_width=True)
                 elif 'month' in result.columns and 'monthly_sales' in result.columns:
-                    st.line_chart(result.set_index('month')['monthly_sales'])
+                    chart = alt.Chart(result).mark_line().encode(x='month:O', y='monthly_sales:Q')
+                    st.altair_chart(chart, use_container_width=True)
                 elif 'product' in result.columns and 'avg_price' in result.columns:
-                    st.bar_chart(result.set_index('product')['avg_price'])
+                    chart = alt.Chart(result).mark_bar().encode(x='product:N', y='avg_price:Q')
+                    st.altair_chart(chart, use_container_width=True)
                     
         except Exception as e:
             st.error(f"Error: {str(e)}")